@@ -1,9 +1,11 @@
 import sys
 import os
 import warnings
-import tempfile
 import time
 import subprocess
+import multiprocessing
+import concurrent.futures
+import itertools
 from pathlib import Path
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QFileDialog, QWidget, 
@@ -12,68 +14,324 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout,
                              QCheckBox, QToolTip, QScrollArea)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData, QUrl
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QFont, QPalette, QColor, QIcon
-from PIL import Image
+from PIL import Image, features
 import io
-import shutil
 import fitz  # PyMuPDF
 import img2pdf
 
-# Import for WebP support
-try:
-    # Make sure Pillow has WebP support
-    Image.init()  # Initialize the image library
-    WEBP_AVAILABLE = "WEBP" in Image.MIME.keys()
-    if WEBP_AVAILABLE:
-        print("WebP format registered with Pillow")
-    else:
-        # Try to register WebP format manually
-        from PIL import features
-        if features.check('webp'):
-            Image.register_mime("WEBP", "image/webp")
-            Image.register_extension("WEBP", ".webp")
-            WEBP_AVAILABLE = True
-            print("WebP format manually registered with Pillow")
-        else:
-            WEBP_AVAILABLE = False
-            print("WebP not available in this Pillow build, falling back to JPEG")
-except Exception as e:
-    WEBP_AVAILABLE = False
-    print(f"WebP support error: {e}, falling back to JPEG")
-
 # Import for AVIF support
 try:
-    # Try to import and register AVIF plugin
     # The pillow_avif plugin registers itself automatically when imported
     from pillow_avif import AvifImagePlugin
+    AVIF_PLUGIN_LOADED = True
+except ImportError:
+    AVIF_PLUGIN_LOADED = False
+    print("pillow_avif plugin not available")
+
+# Load all Pillow plugins once and remember which formats they registered
+Image.init()
+_mimes = set(Image.MIME)
+
+def _ensure_format(name, mime, ext, feature_key):
+    """Check that Pillow knows an image format, registering it manually if its
+    codec is present but no plugin registered it. feature_key is the
+    PIL.features module name to verify the codec with, or None to trust a loaded plugin."""
+    if name in _mimes:
+        print(f"{name} format registered with Pillow")
+        return True
+    try:
+        # features.check warns about names this Pillow version doesn't know,
+        # e.g. "avif" before Pillow added native AVIF support
+        if feature_key is not None and not (feature_key in features.modules
+                                             and features.check_module(feature_key)):
+            print(f"{name} not available in this Pillow build")
+            return False
+        Image.register_mime(name, mime)
+        Image.register_extension(name, ext)
+        _mimes.add(name)
+        print(f"{name} format manually registered with Pillow")
+        return True
+    except Exception as e:
+        print(f"Failed to register {name} format: {e}")
+        return False
+
+WEBP_AVAILABLE = _ensure_format("WEBP", "image/webp", ".webp", "webp")
+AVIF_AVAILABLE = _ensure_format("AVIF", "image/avif", ".avif", None if AVIF_PLUGIN_LOADED else "avif")
+
+# Import for fast JPEG encoding (libjpeg-turbo bindings)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("numpy not available, JPEG encoding will go through Pillow")
+
+try:
+    # PyTurboJPEG needs the libturbojpeg shared library, TurboJPEG() fails if it's missing
+    from turbojpeg import (TurboJPEG, TJPF_RGB, TJPF_GRAY, TJSAMP_420, TJSAMP_GRAY,
+                           TJFLAG_FASTDCT, TJFLAG_PROGRESSIVE)
+    _TJ = TurboJPEG()
+    TURBOJPEG_AVAILABLE = NUMPY_AVAILABLE
+    print("TurboJPEG available for JPEG encoding")
+except Exception as e:
+    TURBOJPEG_AVAILABLE = False
+    print(f"TurboJPEG not available ({e}), trying simplejpeg")
+
+try:
+    import simplejpeg
+    SIMPLEJPEG_AVAILABLE = NUMPY_AVAILABLE
+    print("simplejpeg available for JPEG encoding")
+except ImportError:
+    SIMPLEJPEG_AVAILABLE = False
+    print("simplejpeg not available, falling back to Pillow for JPEG encoding")
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+# (bit shift, format string) for each power of 1024
+_SIZE_FORMATS = (
+    (0, "{} bytes"),
+    (10, "{:.1f} KB"),
+    (20, "{:.2f} MB"),
+    (30, "{:.2f} GB"),
+)
+
+def format_file_size(size_bytes):
+    """Format file size in human-readable format"""
+    index = min(max(0, (size_bytes.bit_length() - 1) // 10), len(_SIZE_FORMATS) - 1)
+    shift, fmt = _SIZE_FORMATS[index]
+    return fmt.format(size_bytes / (1 << shift) if shift else size_bytes)
+
+# Source documents opened by the current worker process, keyed by path
+_worker_docs = {}
+
+def _open_worker_doc(input_path):
+    """Open the source PDF once per worker process and reuse it for later pages"""
+    doc = _worker_docs.get(input_path)
+    if doc is None:
+        doc = _worker_docs[input_path] = fitz.open(input_path)
+    return doc
+
+# Pixmaps the current worker process renders into, keyed by colorspace channels
+_worker_pixmaps = {}
+
+def _render_to_pixmap(displaylist, matrix, colorspace):
+    """Render a display list into a per-worker pixmap that is reused while the
+    page size stays the same, instead of allocating a fresh buffer per page"""
+    irect = (displaylist.rect * matrix).irect
+    pix = _worker_pixmaps.get(colorspace.n)
+    if pix is None or pix.irect != irect:
+        pix = _worker_pixmaps[colorspace.n] = fitz.Pixmap(colorspace, irect, False)
+    pix.clear_with(255)  # Same white background get_pixmap uses without alpha
+    # The area is a device-space scissor, so it has to cover the transformed page
+    displaylist.run(fitz.Device(pix, None), matrix, fitz.Rect(irect))
+    return pix
+
+def _encode_jpeg(arr, quality, optimize=False):
+    """Encode an RGB (h, w, 3) or grayscale (h, w) / (h, w, 1) uint8 array as JPEG bytes.
+    
+    Prefers TurboJPEG, then simplejpeg, both running libjpeg-turbo's SIMD
+    integer DCT. Pillow is only used as a last resort. optimize asks for the
+    extra Huffman pass (progressive mode with TurboJPEG, which implies it);
+    simplejpeg has no such switch and ignores it. Colour images always use 4:2:0
+    chroma subsampling, so the result doesn't depend on the installed
+    encoder's defaults.
+    """
+    gray = arr.ndim == 2 or arr.shape[2] == 1
+    if TURBOJPEG_AVAILABLE:
+        return _TJ.encode(
+            arr.reshape(arr.shape[0], arr.shape[1], 1) if gray else arr,
+            quality=quality,
+            pixel_format=TJPF_GRAY if gray else TJPF_RGB,
+            jpeg_subsample=TJSAMP_GRAY if gray else TJSAMP_420,
+            flags=TJFLAG_FASTDCT | (TJFLAG_PROGRESSIVE if optimize else 0)
+        )
+    if SIMPLEJPEG_AVAILABLE:
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(arr.reshape(arr.shape[0], arr.shape[1], 1) if gray else arr),
+            quality=quality,
+            colorspace='Gray' if gray else 'RGB',
+            colorsubsampling='Gray' if gray else '420',
+            fastdct=True
+        )
+    
+    buffer = io.BytesIO()
+    img = Image.fromarray(arr.reshape(arr.shape[0], arr.shape[1]) if gray else arr)
+    img.save(buffer, format="JPEG", quality=quality, optimize=optimize, subsampling=2)
+    return buffer.getvalue()
+
+# Tiny single-colour JPEGs for blank pages, keyed by colour (per worker process)
+_worker_blank_pages = {}
+
+def _blank_page_image(probe_arr, quality):
+    """Return a 16x16 JPEG of the page colour if the page is (nearly) uniform, else None.
+    
+    insert_image stretches it over the whole page, so blank pages skip the
+    full-size render and encode entirely. probe_arr must be a low-resolution
+    render: MuPDF area-filters it, so thin pen lines still show up, and every
+    pixel is checked. Sparse sampling of a full-resolution render would step
+    over them and drop the page's content.
+    """
+    sample = probe_arr.reshape(-1, probe_arr.shape[2])
+    if np.ptp(sample, axis=0).max() >= 4:
+        return None
+    color = tuple(int(c) for c in sample.mean(axis=0).round())
+    tiny = _worker_blank_pages.get(color)
+    if tiny is None:
+        tiny = _worker_blank_pages[color] = _encode_jpeg(np.full((16, 16, len(color)), color, dtype=np.uint8), quality)
+    return tiny
+
+# Quality reductions for smooth pages: (detail variance limit, quality drop)
+DETAIL_QUALITY_STEPS = ((200, 20), (800, 10), (3000, 5))
+
+def _dynamic_quality(arr, quality):
+    """Lower the quality on smooth, low-detail pages and keep it on detailed ones"""
+    # Subsample before averaging so no full-size float copy of the page is made
+    sample = arr[::8, ::8]
+    gray = sample.mean(axis=2) if sample.ndim == 3 else sample
+    detail = gray.var()
+    for limit, drop in DETAIL_QUALITY_STEPS:
+        if detail < limit:
+            return max(10, quality - drop)
+    return quality
+
+def _render_page(args):
+    """Render a single page and return its JPEG bytes (runs in a worker process)"""
+    input_path, page_num, dpi, quality, max_edge, optimize = args
+    doc = _open_worker_doc(input_path)
+    page = doc[page_num]
+    
+    # Interpret the page content once into a display list, rendering then only
+    # replays it. PyMuPDF holds the GIL and isn't thread-safe, so parallelism
+    # stays at the process level rather than threads sharing one document.
+    # Annotations are left out since the rewritten page keeps them live on top
+    displaylist = page.get_displaylist(annots=False)
+    
+    colorspace = fitz.csRGB
+    if NUMPY_AVAILABLE:
+        # Cheap 36 DPI probe to spot blank pages, which skip the full render, and
+        # grayscale pages, which get rendered and encoded with a single channel
+        probe = displaylist.get_pixmap(matrix=fitz.Matrix(0.5, 0.5), colorspace=fitz.csRGB, alpha=False)
+        probe_arr = np.frombuffer(probe.samples_mv, dtype=np.uint8).reshape(probe.height, probe.width, probe.n)
+        blank = _blank_page_image(probe_arr, quality)
+        if blank is not None:
+            return page_num, blank
+        if probe_arr.std(axis=2).max() < 2:
+            colorspace = fitz.csGRAY
+    
+    # Render page to image at specified DPI, or straight at the capped
+    # resolution so MuPDF rasterizes at the final size in a single pass
+    zoom = dpi / 72
+    longest_edge = max(page.rect.width, page.rect.height)
+    if max_edge and longest_edge * zoom > max_edge:
+        zoom = max_edge / longest_edge
+    pix = _render_to_pixmap(displaylist, fitz.Matrix(zoom, zoom), colorspace)
+    
+    # Encode with fallback mechanism.
+    # Always use JPEG: it is embedded as-is under /DCTDecode, while AVIF and
+    # WebP have no PDF filter and get decoded into a much larger Flate pixmap.
+    # JPEG 2000 (/JPXDecode) would embed as-is too, but encoded far slower and
+    # came out larger than JPEG at matched PSNR on scanned pages
+    if NUMPY_AVAILABLE:
+        # Zero-copy view of MuPDF's pixel buffer. pix is the worker's reused
+        # pixmap, so arr is only valid until the next page is rendered
+        arr = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        quality = _dynamic_quality(arr, quality)
+        return page_num, _encode_jpeg(arr, quality, optimize)
+    
+    try:
+        return page_num, pix.pil_tobytes(format="JPEG", quality=quality, optimize=optimize,
+                                         subsampling=2)
+    except Exception as e:
+        print(f"Error saving image: {e}")
+        # Fall back to a lower quality setting if there's an error
+        return page_num, pix.pil_tobytes(format="JPEG", quality=60, optimize=optimize,
+                                         subsampling=2)
+
+# Pages with less extractable text than this and a single full-page image
+# are treated as scans and rasterized, everything else keeps its vector content
+SCANNED_PAGE_TEXT_LIMIT = 10
+
+def _is_scanned_page(page):
+    """Check whether a page is just one full-page image with (almost) no text"""
+    if len(page.get_text().strip()) >= SCANNED_PAGE_TEXT_LIMIT:
+        return False
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return False
+    page_area = page.rect.get_area()
+    return any(rect.get_area() >= 0.9 * page_area for rect in page.get_image_rects(images[0][0]))
+
+def _recompress_image(doc, xref, quality, max_edge=None, optimize=False):
+    """Re-encode an embedded image stream as JPEG in place.
+    
+    Returns True if the stream was replaced, False if it was skipped or the
+    re-encoded image would not be smaller.
+    """
+    # Leave stencil masks, colour-key masks and custom decode arrays alone,
+    # a lossy RGB/gray rewrite would change how they render
+    for key in ("ImageMask", "Mask", "Decode"):
+        if doc.xref_get_key(xref, key)[0] != "null":
+            return False
+    
+    info = doc.extract_image(xref)
+    if not info or info.get("bpc", 8) < 8 or info.get("colorspace") not in (1, 3, 4):
+        return False
     
-    # Verify AVIF is registered
-    Image.init()  # Re-initialize to detect newly registered formats
-    AVIF_AVAILABLE = "AVIF" in Image.MIME.keys()
-    if AVIF_AVAILABLE:
-        print("AVIF format registered with Pillow")
+    img = Image.open(io.BytesIO(info["image"]))
+    img = img.convert("L" if img.mode in ("L", "LA") else "RGB")
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    if NUMPY_AVAILABLE:
+        new_bytes = _encode_jpeg(np.asarray(img), quality, optimize)
     else:
-        # Try manual registration
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=optimize)
+        new_bytes = buffer.getvalue()
+    if len(new_bytes) >= len(doc.xref_stream_raw(xref)):
+        return False
+    
+    doc.update_stream(xref, new_bytes, compress=False)
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    doc.xref_set_key(xref, "DecodeParms", "null")
+    doc.xref_set_key(xref, "ColorSpace", "/DeviceGray" if img.mode == "L" else "/DeviceRGB")
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    doc.xref_set_key(xref, "Width", str(img.width))
+    doc.xref_set_key(xref, "Height", str(img.height))
+    return True
+
+def _recompress_page_images(doc, page_num, seen_xrefs, quality, max_edge=None, optimize=False):
+    """Recompress the embedded images of one kept page, skipping xrefs already handled"""
+    for img in doc[page_num].get_images(full=True):
+        xref = img[0]
+        if xref in seen_xrefs:
+            continue
+        seen_xrefs.add(xref)
         try:
-            # Try to register the format manually if it's not detected
-            Image.register_mime("AVIF", "image/avif")
-            Image.register_extension("AVIF", ".avif")
-            
-            # Check again after manual registration
-            Image.init()
-            AVIF_AVAILABLE = "AVIF" in Image.MIME.keys()
-            if AVIF_AVAILABLE:
-                print("AVIF format manually registered with Pillow")
-            else:
-                AVIF_AVAILABLE = False
-                print("AVIF format not registered with Pillow")
+            _recompress_image(doc, xref, quality, max_edge, optimize)
         except Exception as e:
-            AVIF_AVAILABLE = False
-            print(f"Failed to register AVIF format: {e}, falling back to WebP or JPEG")
-except ImportError:
-    AVIF_AVAILABLE = False
-    print("AVIF not available, falling back to WebP or JPEG")
+            print(f"Skipping image {xref}: {e}")
 
-warnings.filterwarnings("ignore", category=DeprecationWarning)
+def _replace_page_with_image(doc, page, image_bytes):
+    """Swap a page's content for one full-page image, keeping its boxes and annotations"""
+    # Point the page at a fresh empty content stream instead of blanking the
+    # old one, which other pages may share
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, b"")
+    page.set_contents(xref)
+    
+    # Drop the old resources so garbage collection can reclaim the original
+    # images and fonts once no other page uses them
+    doc.xref_set_key(page.xref, "Resources", "<<>>")
+    
+    # insert_image maps its rect back to PDF space through transformation_matrix,
+    # so aim it at the CropBox in PDF coordinates: page.rect and the derotation
+    # matrix don't account for boxes that start away from the origin. The image
+    # was rendered in the visible orientation, so counter-rotate it for /Rotate
+    cropbox, mediabox = page.cropbox, page.mediabox
+    pdf_cropbox = fitz.Rect(cropbox.x0, mediabox.y1 - cropbox.y1, cropbox.x1, mediabox.y1 - cropbox.y0)
+    page.insert_image(pdf_cropbox * page.transformation_matrix, stream=image_bytes,
+                      keep_proportion=False, rotate=page.rotation)
 
 class CompressorThread(QThread):
     progress_update = pyqtSignal(int)
@@ -85,11 +343,29 @@ class CompressorThread(QThread):
         self.input_path = input_path
         self.output_path = output_path
         self.compression_options = compression_options
+        self._last_pct = -1
+        self._last_emit_ns = 0
+    
+    def _emit_progress(self, pct, force=False):
+        """Emit progress only when it changes, at most every 20 ms unless forced"""
+        now = time.monotonic_ns()
+        if pct != self._last_pct and (force or now - self._last_emit_ns > 20_000_000):
+            self.progress_update.emit(pct)
+            self._last_pct = pct
+            self._last_emit_ns = now
         
     def run(self):
         try:
             compression_level = self.compression_options.get('level', 'Medium')
             remove_metadata = self.compression_options.get('remove_metadata', True)
+            downscale = self.compression_options.get('downscale_images', True)
+            # Linearizing restructures the whole file for byte-range streaming,
+            # which only pays off for PDFs served over the web
+            web_optimize = self.compression_options.get('web_optimize', False)
+            # The extra Huffman pass costs encode time for a few percent, so only
+            # spend it when the user asked for the smaller files
+            optimize_jpeg = self.compression_options.get(
+                'optimize_jpeg', compression_level in ("High", "Very High"))
             
             # Define quality settings based on compression level
             quality_mapping = {
@@ -105,132 +381,154 @@ class CompressorThread(QThread):
                 "Medium": 200,   # Good balance
                 "High": 150,     # Significant compression
                 "Very High": 100 # Maximum compression
-            }            # Select best available format based on compression capabilities
-            if AVIF_AVAILABLE:
-                primary_format = "AVIF"  # AVIF offers best compression
-            elif WEBP_AVAILABLE:
-                primary_format = "WEBP"  # WebP is second best
-            else:
-                primary_format = "JPEG"  # JPEG as fallback
+            }
+            
+            # Longest edge in pixels for rendered pages and embedded images
+            # when downscaling is enabled
+            max_edge_mapping = {
+                "Low": 2200,      # High quality
+                "Medium": 1700,   # Good balance
+                "High": 1300,     # Significant compression
+                "Very High": 1000 # Maximum compression
+            }
             
             # Print detected formats
             print(f"Available image formats: {', '.join(Image.MIME.keys())}")
-            print(f"Using format: {primary_format}")
                 
             quality = quality_mapping[compression_level]
             dpi = dpi_mapping[compression_level]
+            max_edge = max_edge_mapping[compression_level] if downscale else None
             
             # Print debug info
-            print(f"Starting compression with level: {compression_level}, DPI: {dpi}, format: {primary_format}")
+            print(f"Starting compression with level: {compression_level}, DPI: {dpi}")
             print(f"Input file size: {os.path.getsize(self.input_path)} bytes")
             
-            # Create temp directory for intermediate files
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Open the PDF with PyMuPDF (fitz)
-                doc = fitz.open(self.input_path)
-                total_pages = len(doc)
-                
-                # Extract each page as an image
-                image_files = []
-                for page_num in range(total_pages):
-                    self.progress_update.emit(int((page_num + 1) / total_pages * 40))
-                    
-                    page = doc[page_num]
-                    
-                    # Render page to image at specified DPI
-                    pix = page.get_pixmap(dpi=dpi)
-                      # Convert to PIL Image for processing
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    
-                    # Save with selected format with fallback mechanism
-                    try:
-                        # Always use JPEG as the intermediate format because AVIF and WebP might 
-                        # not be fully compatible with PyMuPDF for insertion
-                        img_path = os.path.join(temp_dir, f"page_{page_num:04d}.jpg")
-                        img.save(img_path, format="JPEG", quality=quality, optimize=True)
-                    except Exception as e:
-                        print(f"Error saving image: {e}")
-                        # Fall back to a lower quality setting if there's an error
-                        img_path = os.path.join(temp_dir, f"page_{page_num:04d}.jpg")
-                        img.save(img_path, format="JPEG", quality=60, optimize=True)
-                    
-                    image_files.append(img_path)
-                
-                # Close the source PDF
-                doc.close()
-                
-                self.progress_update.emit(70)  # 70% progress
-                
-                # Create a new PDF from the compressed images
-                pdf_output = os.path.join(temp_dir, "compressed_output.pdf")
-                
-                # Get page dimensions from original PDF
-                with fitz.open(self.input_path) as doc:
-                    # Create a new PDF with blank pages of the same dimensions
-                    new_pdf = fitz.open()
-                    
-                    # Process each compressed image
-                    for i, img_path in enumerate(image_files):
-                        self.progress_update.emit(70 + int((i + 1) / len(image_files) * 20))
-                        
-                        # Create a new page with the same dimensions as the original
-                        page_rect = doc[i].rect
-                        new_page = new_pdf.new_page(width=page_rect.width, height=page_rect.height)
-                        
-                        # Insert the compressed image into the page
-                        with open(img_path, "rb") as img_file:
-                            img_data = img_file.read()
-                            new_page.insert_image(new_page.rect, stream=img_data)
+            # Open the PDF with PyMuPDF (fitz)
+            doc = fitz.open(self.input_path)
+            total_pages = len(doc)
+            
+            # Only scanned pages are rasterized, the others keep their text and
+            # line art and just get their embedded images recompressed
+            raster_pages = [page.number for page in doc if _is_scanned_page(page)]
+            vector_pages = sorted(set(range(total_pages)) - set(raster_pages))
+            print(f"Rasterizing {len(raster_pages)} scanned pages, recompressing images on {len(vector_pages)} pages")
+            
+            # Render each scanned page in a pool of one worker process per core.
+            # Each worker opens its own copy of the document since fitz objects
+            # cannot be shared between processes. Rendering and insertion overlap:
+            # at most two pages per worker are in flight and each encoded page goes
+            # into the document as soon as it arrives, so finished pages don't pile
+            # up in a result list. The document itself still holds every inserted
+            # page until it is saved. Pages are patched in place, so they don't
+            # need to arrive in order
+            jobs = iter([(self.input_path, page_num, dpi, quality, max_edge, optimize_jpeg)
+                         for page_num in raster_pages])
+            vector_queue = iter(vector_pages)
+            next_vector_page = next(vector_queue, None)
+            seen_xrefs = set()
+            pages_done = 0
+            pending = set()
+            pool = None
+            if raster_pages:
+                workers = max(1, min(os.cpu_count() or 1, len(raster_pages)))
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+                for job in itertools.islice(jobs, 2 * workers):
+                    pending.add(pool.submit(_render_page, job))
+            
+            try:
+                while pending or next_vector_page is not None:
+                    # Insert whatever the workers finished and top the window back up.
+                    # Only block when there is no kept page left to work on meanwhile
+                    if pending:
+                        done, pending = concurrent.futures.wait(
+                            pending,
+                            timeout=None if next_vector_page is None else 0,
+                            return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        for future in done:
+                            page_num, img_data = future.result()
+                            # Put the compressed image straight into the source document, so
+                            # outline, page boxes and annotations survive without a second PDF
+                            _replace_page_with_image(doc, doc[page_num], img_data)
+                            pages_done += 1
+                            job = next(jobs, None)
+                            if job is not None:
+                                pending.add(pool.submit(_render_page, job))
                     
-                    # If requested, remove metadata
-                    if remove_metadata:
-                        new_pdf.set_metadata({})
+                    # Recompress the embedded images of one kept page in place while
+                    # the workers render. Images shared between pages are only handled once
+                    if next_vector_page is not None:
+                        _recompress_page_images(doc, next_vector_page, seen_xrefs, quality, max_edge, optimize_jpeg)
+                        next_vector_page = next(vector_queue, None)
+                        pages_done += 1
                     
-                    # Save with maximum compression settings
-                    new_pdf.save(
-                        pdf_output,
-                        garbage=4,       # Maximum garbage collection
-                        deflate=True,    # Compress streams
-                        clean=True,      # Clean content
-                        linear=True,     # Optimize for web
-                        pretty=False     # No pretty printing
-                    )
-                
-                self.progress_update.emit(95)  # 95% done
-                
-                # Check the result
-                original_size = os.path.getsize(self.input_path)
-                compressed_size = os.path.getsize(pdf_output)
-                
-                if compressed_size >= original_size:
-                    self.error.emit("Compression resulted in a larger file. Original file preserved.")
-                    return
-                
-                # Copy the result to the output location
-                shutil.copy2(pdf_output, self.output_path)
-                
-                # Calculate size reduction
-                original_formatted = self.format_file_size(original_size)
-                compressed_formatted = self.format_file_size(compressed_size)
-                savings = ((original_size - compressed_size) / original_size) * 100
-                
-                self.progress_update.emit(100)  # 100% done
-                self.finished.emit(
-                    f"Compression complete! File size reduced by {savings:.1f}%",
-                    original_formatted,
-                    compressed_formatted
-                )
-                
+                    self._emit_progress(int(pages_done / total_pages * 90))
+            finally:
+                if pool is not None:
+                    for future in pending:
+                        future.cancel()
+                    pool.shutdown()
+            
+            self._emit_progress(90, force=True)  # 90% progress
+            
+            # Save next to the destination so the final move is an atomic
+            # rename on the same filesystem rather than a full copy
+            pdf_output = self.output_path + ".part"
+            
+            # If requested, remove metadata
+            if remove_metadata:
+                doc.set_metadata({})
+                doc.del_xml_metadata()
+            
+            # Save with maximum compression settings. Streams that already have
+            # a filter are kept as they are, so the DCT page images never go
+            # through zlib again
+            doc.save(
+                pdf_output,
+                garbage=4,       # Maximum garbage collection
+                deflate=True,    # Compress streams
+                deflate_images=True,  # Compress unfiltered images
+                deflate_fonts=True,   # Compress unfiltered fonts
+                clean=True,      # Clean content
+                linear=web_optimize,  # Optimize for web if requested
+                pretty=False     # No pretty printing
+            )
+            
+            # Close the source PDF
+            doc.close()
+            
+            self._emit_progress(95, force=True)  # 95% done
+            
+            # Check the result
+            original_size = os.path.getsize(self.input_path)
+            compressed_size = os.path.getsize(pdf_output)
+            
+            if compressed_size >= original_size:
+                os.remove(pdf_output)
+                self.error.emit("Compression resulted in a larger file. Original file preserved.")
+                return
+            
+            # Move the result to the output location
+            os.replace(pdf_output, self.output_path)
+            
+            # Calculate size reduction
+            original_formatted = format_file_size(original_size)
+            compressed_formatted = format_file_size(compressed_size)
+            savings = ((original_size - compressed_size) / original_size) * 100
+            
+            self._emit_progress(100, force=True)  # 100% done
+            self.finished.emit(
+                f"Compression complete! File size reduced by {savings:.1f}%",
+                original_formatted,
+                compressed_formatted
+            )
+            
         except Exception as e:
+            # Don't leave a half-written result next to the destination
+            part_path = self.output_path + ".part"
+            if os.path.exists(part_path):
+                os.remove(part_path)
             self.error.emit(f"Error: {str(e)}")
-            
-    def format_file_size(self, size_bytes):
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.2f} MB"
 
 class DropAreaFrame(QFrame):
     def __init__(self, parent=None):
@@ -480,6 +778,11 @@ class PDFCompressorApp(QMainWindow):
         self.metadata_checkbox.setToolTip("Removes document metadata like author, creation date, etc.")
         options_layout.addWidget(self.metadata_checkbox)
         
+        self.web_optimize_checkbox = QCheckBox("Optimize for web")
+        self.web_optimize_checkbox.setChecked(False)
+        self.web_optimize_checkbox.setToolTip("Linearizes the PDF so browsers can show the first pages while downloading (slower to save)")
+        options_layout.addWidget(self.web_optimize_checkbox)
+        
         self.scroll_layout.addWidget(options_group)
 
         # Progress section
@@ -541,7 +844,7 @@ class PDFCompressorApp(QMainWindow):
             self.current_file = file_path
             file_name = os.path.basename(file_path)
             file_size = os.path.getsize(file_path)
-            self.file_label.setText(f"Selected: {file_name} ({self.format_file_size(file_size)})")
+            self.file_label.setText(f"Selected: {file_name} ({format_file_size(file_size)})")
             self.compress_button.setEnabled(True)
             self.result_frame.setVisible(False)
             
@@ -620,7 +923,8 @@ class PDFCompressorApp(QMainWindow):
             compression_options = {
                 'level': self.compression_combo.currentText(),
                 'downscale_images': self.downscale_checkbox.isChecked(),
-                'remove_metadata': self.metadata_checkbox.isChecked()
+                'remove_metadata': self.metadata_checkbox.isChecked(),
+                'web_optimize': self.web_optimize_checkbox.isChecked()
             }
 
             # Start compression in background thread
@@ -656,16 +960,9 @@ class PDFCompressorApp(QMainWindow):
         self.drop_area.setIconDrop()
         QMessageBox.critical(self, "Error", message)
 
-    def format_file_size(self, size_bytes):
-        """Format file size in human-readable format"""
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.2f} MB"
-
 if __name__ == "__main__":
+    # Required for the page rendering pool in frozen Windows builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = PDFCompressorApp()
     window.show()